@@ -12,7 +12,10 @@ import time
 from typing import Dict, List, Tuple, Optional
 from datetime import date, datetime, timedelta, timezone
 import hashlib
+import functools
 import math
+import random
+from email.utils import parsedate_to_datetime
 import threading
 from concurrent.futures import ThreadPoolExecutor
 import requests
@@ -26,6 +29,8 @@ from contextlib import redirect_stdout, redirect_stderr
 from io import StringIO
 from typing import Optional
 import shutil
+import socket
+import tempfile
 import logging
 import textwrap
 from pathlib import Path
@@ -33,7 +38,7 @@ import warnings
 import importlib.metadata
 
 
-from copy import deepcopy
+from collections import deque
 
 PYPI_BASE_PATH = "https://pypi.org"
 # INFO - Change to False if you don't want to check for update each run.
@@ -48,9 +53,10 @@ except:
     pass
 
 try:
-    import curlify
+    # Optional: faster JSON encoding/decoding for request and response bodies
+    import orjson
 except ImportError:
-    pass
+    orjson = None
 
 try:
     from urllib import quote_plus  # Python 2.X
@@ -230,6 +236,9 @@ for key in DIRS.keys():
   if not os.path.exists(path):
     os.makedirs(path)
 
+SECONDS_PER_DAY = 24 * 60 * 60
+SECONDS_PER_WEEK = 7 * SECONDS_PER_DAY
+
 CACHE_FILE = os.path.join(DIRS['temp'], "gpu_names_cache.json")
 CACHE_DURATION = timedelta(hours=24)
 
@@ -242,6 +251,20 @@ if not os.path.exists(APIKEY_FILE) and os.path.exists(APIKEY_FILE_HOME):
   shutil.copyfile(APIKEY_FILE_HOME, APIKEY_FILE)
 
 
+@functools.lru_cache(maxsize=2)
+def read_api_key(key_file: str) -> Optional[str]:
+    """Returns the key stored in key_file, or None if the file doesn't exist.
+
+    Cached for the life of the process; call read_api_key.cache_clear() after
+    writing or removing a key file.
+    """
+    try:
+        with open(key_file, "r") as reader:
+            return reader.read().strip()
+    except FileNotFoundError:
+        return None
+
+
 api_key_guard = object()
 
 headers = {}
@@ -293,6 +316,23 @@ def unix_to_readable(ts):
     # ts: integer or float, Unix timestamp
     return datetime.fromtimestamp(ts).strftime('%H:%M:%S|%h-%d-%Y')
 
+# Tried in order with strptime before falling back to dateutil's (much slower) format detection
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S%z")
+
+def parse_date(value) -> datetime:
+    """Parses a user-supplied date string into a datetime. Raises ValueError if it can't."""
+    s = str(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(s, fmt)
+        except ValueError:
+            pass
+    try:
+        from dateutil import parser as dateutil_parser
+    except ImportError:
+        raise ValueError(f"unrecognized date format {s!r} (install python-dateutil for more formats)")
+    return dateutil_parser.parse(s)
+
 def fix_date_fields(query: Dict[str, Dict], date_fields: List[str]):
     """Takes in a query and date fields to correct and returns query with appropriate epoch dates"""
     new_query: Dict[str, Dict] = {}
@@ -330,33 +370,182 @@ class hidden_aliases(object):
     def append(self, x):
         self.l.append(x)
 
-def http_request(verb, args, req_url, headers: dict[str, str] | None = None, json_data = None):
-    t = 0.15
-    for i in range(0, args.retry):
-        req = requests.Request(method=verb, url=req_url, headers=headers, json=json_data)
+# One session per process so urllib3 keeps the TLS connection alive across
+# retries and across the several calls a single command may make. Created on
+# first use so commands that never hit the network don't pay for it.
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+# Methods that are safe to resend; PUT and POST create or change things in this API
+IDEMPOTENT_VERBS = frozenset(("GET", "HEAD", "DELETE"))
+
+class KeepAliveAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter whose pooled sockets enable TCP keepalive.
+
+    urllib3's defaults (TCP_NODELAY) are kept; keepalive makes idle pooled
+    connections less likely to be silently dropped by middleboxes between calls,
+    which would otherwise cost a reconnect and TLS handshake.
+    """
+    socket_options = urllib3.connection.HTTPConnection.default_socket_options + [
+        (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+    ]
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = self.socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+def get_session() -> requests.Session:
+    """Returns the shared requests.Session used by the http_* helpers."""
+    global _SESSION
+    if _SESSION is not None:
+        return _SESSION
+    # Worker threads can make their first request at the same moment; only one may build the session
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            return _SESSION
         session = requests.Session()
+        # Transient gateway errors on GET/HEAD/DELETE are retried in urllib3 on the same
+        # pooled connection; 429s, Retry-After and timeouts are left to the retry loop in http_request.
+        # read=False re-raises read timeouts as-is so requests reports them as ReadTimeout.
+        retries = urllib3.util.Retry(total=3, connect=0, read=False, backoff_factor=0.3,
+                                     status_forcelist=(502, 503, 504), raise_on_status=False,
+                                     allowed_methods=IDEMPOTENT_VERBS, respect_retry_after_header=False)
+        adapter = KeepAliveAdapter(pool_connections=2, pool_maxsize=16, max_retries=retries)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _SESSION = session
+    return _SESSION
+
+_CURL_HEADER_RE = re.compile(r" -H '[^']*'")
+_CURL_SPLIT_RE = re.compile(r'(?=\s+-\S+)')
+
+def format_curl(prep) -> str:
+    """Renders a PreparedRequest as a multi-line curl command, without headers."""
+    import curlify
+    simple = _CURL_HEADER_RE.sub('', curlify.to_curl(prep))
+    parts = _CURL_SPLIT_RE.split(simple)
+    # The url is always the last (quote-free) single-quoted token; give it its own line.
+    head, _, url = parts[-1].rpartition(" '")
+    parts = [*parts[:-1], head.rstrip(), " '" + url]
+    return ' \\\n  '.join(parts).strip()
+
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 30.0
+
+RETRY_BACKOFF_BASE = 0.25
+RETRY_BACKOFF_CAP = 30.0
+RATE_LIMIT_WINDOW = 10.0
+
+# Times of recent 429s, shared by every thread issuing requests (bulk commands
+# fan out through exec_with_threads), so concurrent workers back off together.
+_rate_limit_hits = deque()
+_rate_limit_lock = threading.Lock()
+
+def note_rate_limited() -> int:
+    """Records a 429 and returns how many were seen within RATE_LIMIT_WINDOW."""
+    now = time.monotonic()
+    with _rate_limit_lock:
+        while _rate_limit_hits and now - _rate_limit_hits[0] > RATE_LIMIT_WINDOW:
+            _rate_limit_hits.popleft()
+        _rate_limit_hits.append(now)
+        return len(_rate_limit_hits)
+
+def retry_delay(r, attempt: int, congestion: int = 1) -> float:
+    """Returns how long to wait before retrying a rate-limited (429) response,
+    or a request that timed out (r is None).
+
+    Honors the server's Retry-After header (delta-seconds or HTTP-date, capped at
+    RETRY_BACKOFF_CAP) and otherwise falls back to exponential backoff with full
+    jitter, scaled up by the number of 429s recently seen process-wide (congestion).
+    """
+    retry_after = r.headers.get("Retry-After") if r is not None else None
+    if retry_after:
+        try:
+            return min(RETRY_BACKOFF_CAP, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(retry_after)
+            if when.tzinfo is None:
+                when = when.replace(tzinfo=timezone.utc)
+            return min(RETRY_BACKOFF_CAP, max(0.0, (when - datetime.now(timezone.utc)).total_seconds()))
+        except (TypeError, ValueError):
+            pass
+    return min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * congestion * 2 ** attempt) * random.random()
+
+def json_body(json_data, headers: dict[str, str] | None = None) -> Tuple[dict, Optional[dict]]:
+    """Returns the requests kwargs that send json_data as the body, plus the headers to use.
+
+    Encodes with orjson when it's installed, falling back to requests' own json=
+    handling for payloads orjson can't serialize (e.g. non-str dict keys).
+    """
+    if json_data is None or orjson is None:
+        return {"json": json_data}, headers
+    try:
+        data = orjson.dumps(json_data)
+    except TypeError:
+        return {"json": json_data}, headers
+    return {"data": data}, {"Content-Type": "application/json", **(headers or {})}
+
+def response_json(r):
+    """Same as r.json(), but decoded with orjson when it's installed."""
+    if orjson is not None:
+        try:
+            return orjson.loads(r.content)
+        except orjson.JSONDecodeError:
+            pass  # let requests raise its usual JSONDecodeError
+    return r.json()
+
+def json_arg(value: str):
+    """argparse type for options that take a JSON string; parsed with orjson when it's installed."""
+    return (orjson or json).loads(value)
+
+def http_request(verb, args, req_url, headers: dict[str, str] | None = None, json_data = None):
+    session = get_session()
+    body, req_headers = json_body(json_data, headers)
+    prep = None
+    # Only build an explicit PreparedRequest when it has to be shown;
+    # otherwise let session.request() prepare and send in one step.
+    if args.explain or ARGS.curl:
+        req = requests.Request(method=verb, url=req_url, headers=req_headers, **body)
         prep = session.prepare_request(req)
         if args.explain:
             print(f"\n{INFO}  Prepared Request:")
             print(f"{prep.method} {prep.url}")
             print(f"Headers: {json.dumps(headers, indent=1)}")
             print(f"Body: {json.dumps(json_data, indent=1)}" + "\n" + "_"*100 + "\n")
-        
+
         if ARGS.curl:
-            as_curl = curlify.to_curl(prep)
-            simple = re.sub(r" -H '[^']*'", '', as_curl)
-            parts = re.split(r'(?=\s+-\S+)', simple)
-            pp = parts[-1].split("'")
-            pp[-3] += "\n "
-            parts = [*parts[:-1], *[x.rstrip() for x in "'".join(pp).split("\n")]]
-            print("\n" + ' \\\n  '.join(parts).strip() + "\n")
+            print("\n" + format_curl(prep) + "\n")
             sys.exit(0)
-        else:
-            r = session.send(prep)
 
-        if (r.status_code == 429):
-            time.sleep(t)
-            t *= 1.5
+    # Namespaces built internally (e.g. by self-test) may not carry --timeout
+    timeout = (CONNECT_TIMEOUT, getattr(args, "timeout", None) or READ_TIMEOUT)
+    for i in range(0, args.retry):
+        try:
+            if prep is not None:
+                r = session.send(prep, timeout=timeout)
+            else:
+                r = session.request(verb, req_url, headers=req_headers, timeout=timeout, **body)
+        except requests.exceptions.Timeout as e:
+            # A read timeout means the server may already have acted on the request,
+            # so only idempotent verbs are resent; connect timeouts never reached it.
+            if i + 1 >= args.retry or (verb not in IDEMPOTENT_VERBS
+                                       and not isinstance(e, requests.exceptions.ConnectTimeout)):
+                raise
+            delay = retry_delay(None, i)
+            logging.debug(f"request timed out, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+
+        if (r.status_code == 429) and i + 1 < args.retry:
+            try:
+                code = r.json().get("code")
+            except (JSONDecodeError, AttributeError):
+                code = None
+            delay = retry_delay(r, i, note_rate_limited())
+            logging.debug(f"rate limited ({code or 429}), retrying in {delay:.2f}s")
+            time.sleep(delay)
         else:
             break
     return r
@@ -373,6 +562,15 @@ def http_post(args, req_url, headers = None, json={}):
 def http_del(args, req_url, headers = None, json={}):
     return http_request('DELETE', args, req_url, headers, json)
 
+def put_json(args, req_url, json_blob):
+    """PUTs json_blob with the global auth headers (printing it first with --explain) and raises on HTTP errors."""
+    if args.explain:
+        print("request json: ")
+        print(json_blob)
+    r = http_put(args, req_url, headers=headers, json=json_blob)
+    r.raise_for_status()
+    return r
+
 
 def load_permissions_from_file(file_path):
     with open(file_path, 'r') as file:
@@ -572,6 +770,26 @@ def translate_null_strings_to_blanks(d: Dict) -> Dict:
     #req_url = apiurl(args, "/instances", {"owner": "me"});
 
 
+_API_VERSION_RE = re.compile(r"^/api/v\d+/")
+# Characters quote_plus() leaves untouched; values made only of these skip quoting.
+_SAFE_QUERY_RE = re.compile(r"[A-Za-z0-9_.~\-]*")
+
+def _query_value(y) -> str:
+    if isinstance(y, str):
+        if _SAFE_QUERY_RE.fullmatch(y):
+            return y
+        return quote_plus(y)
+    return quote_plus(json.dumps(y))
+
+@functools.lru_cache(maxsize=256)
+def _build_url(base: str, subpath: str, query_items: Tuple) -> str:
+    if not _API_VERSION_RE.match(subpath):
+        subpath = "/api/v0" + subpath
+    if query_items:
+        query_json = "&".join([f"{x}={_query_value(y)}" for x, y, _ in query_items])
+        return base + subpath + "?" + query_json
+    return base + subpath
+
 def apiurl(args: argparse.Namespace, subpath: str, query_args: Dict = None) -> str:
     """Creates the endpoint URL for a given combination of parameters.
 
@@ -580,55 +798,53 @@ def apiurl(args: argparse.Namespace, subpath: str, query_args: Dict = None) -> s
     :param typing.Dict query_args: specifics such as API key and search parameters that complete the URL.
     :rtype str:
     """
-    result = None
-
     if query_args is None:
         query_args = {}
     if args.api_key is not None:
         query_args["api_key"] = args.api_key
-    if not re.match(r"^/api/v(\d)+/", subpath):
-        subpath = "/api/v0" + subpath
-    
-    query_json = None
-
-    if query_args:
-        # a_list      = [<expression> for <l-expression> in <expression>]
-        '''
-        vector result;
-        for (l_expression: expression) {
-            result.push_back(expression);
-        }
-        '''
-        # an_iterator = (<expression> for <l-expression> in <expression>)
 
-        query_json = "&".join(
-            "{x}={y}".format(x=x, y=quote_plus(y if isinstance(y, str) else json.dumps(y))) for x, y in
-            query_args.items())
-        
-        result = args.url + subpath + "?" + query_json
-    else:
-        result = args.url + subpath
+    # the value type is part of the key so that e.g. True and 1 don't collide
+    query_items = tuple((x, y, type(y)) for x, y in query_args.items())
+    try:
+        result = _build_url(args.url, subpath, query_items)
+    except TypeError:
+        # dict/list query values (e.g. search queries) aren't hashable; build uncached
+        result = _build_url.__wrapped__(args.url, subpath, query_items)
 
     if (args.explain):
         print("query args:")
         print(query_args)
         print("")
-        print(f"base: {args.url + subpath + '?'} + query: ")
+        print(f"base: {result.partition('?')[0] + '?'} + query: ")
         print(result)
         print("")
     return result
 
+@functools.lru_cache(maxsize=4)
+def _auth_headers(api_key: Optional[str]) -> Dict:
+    result = {}
+    if api_key is not None:
+        result["Authorization"] = "Bearer " + api_key
+    return result
+
 def apiheaders(args: argparse.Namespace) -> Dict:
     """Creates the headers for a given combination of parameters.
 
+    The returned dict is shared between calls with the same key; don't mutate it.
+
     :param argparse.Namespace args: Namespace with many fields relevant to the endpoint.
     :rtype Dict:
     """
-    result = {}
-    if args.api_key is not None:
-        result["Authorization"] = "Bearer " + args.api_key
-    return result 
+    return _auth_headers(args.api_key)
+
 
+_TRAILING_SPACES_RE = re.compile(r" *$", re.MULTILINE)
+_LEADING_INDENT_RE = re.compile(r"^ *(?=[^ ])", re.MULTILINE)
+
+@functools.lru_cache(maxsize=1)
+def _epilog_separator() -> str:
+    # ~85 epilogs are built at import, so the terminal width is looked up once and reused
+    return "_" * min(150, shutil.get_terminal_size((80, 20)).columns)
 
 def deindent(message: str, add_separator: bool = True) -> str:
     """
@@ -638,14 +854,15 @@ def deindent(message: str, add_separator: bool = True) -> str:
     :param str message: Message to deindent.
     :rtype str:
     """
-    message = re.sub(r" *$", "", message, flags=re.MULTILINE)
-    indents = [len(x) for x in re.findall("^ *(?=[^ ])", message, re.MULTILINE) if len(x)]
+    message = _TRAILING_SPACES_RE.sub("", message)
+    indents = [len(x) for x in _LEADING_INDENT_RE.findall(message) if len(x)]
     a = min(indents)
-    message = re.sub(r"^ {," + str(a) + "}", "", message, flags=re.MULTILINE)
+    # strip up to `a` leading spaces from every line
+    message = "\n".join([line[:a].lstrip(" ") + line[a:] for line in message.split("\n")])
     if add_separator:
         # For help epilogs - cleanly separating extra help from options
-        line_width = min(150, shutil.get_terminal_size((80, 20)).columns)
-        message = "_"*line_width + "\n"*2 + message.strip() + "\n" + "_"*line_width
+        separator = _epilog_separator()
+        message = separator + "\n"*2 + message.strip() + "\n" + separator
     return message.strip()
 
 
@@ -1046,6 +1263,19 @@ offers_mult = {
 }
 
 
+_ORDER_RE = re.compile(r"([+-]*)(\w+)([+-]*)")
+
+def parse_order(order_str: str, field_alias = {}) -> List[List[str]]:
+    """Parses an --order string like 'num_gpus,total_flops-' into [[field, direction], ...].
+
+    A field prefixed or postfixed with - sorts descending, unless it is also marked with +.
+    """
+    return [
+        [field_alias.get(field, field), "desc" if "-" in pre + post and "+" not in pre + post else "asc"]
+        for pre, field, post in _ORDER_RE.findall(order_str)
+    ]
+
+
 def parse_query(query_str: str, res: Dict = None, fields = {}, field_alias = {}, field_multiplier = {}) -> Dict:
     """
     Basically takes a query string (like the ones in the examples of commands for the search__offers function) and
@@ -1163,6 +1393,13 @@ def parse_query(query_str: str, res: Dict = None, fields = {}, field_alias = {},
     #print(res)
     return res
 
+def env_pairs_to_dict(extra_env) -> Dict:
+    """Return an instance's extra_env as a dict; the API sends it as a list of [name, value] pairs."""
+    if isinstance(extra_env, dict):
+        return extra_env
+    return dict(extra_env) if extra_env else {}
+
+
 # ANSI escape codes for background/foreground colors
 BG_DARK_GRAY = '\033[40m'  # Dark gray background
 BG_LIGHT_GRAY = '\033[48;5;240m' # Light gray background
@@ -1184,21 +1421,21 @@ def display_table(rows: list, fields: Tuple, replace_spaces: bool = True, auto_w
     header = [name for _, name, _, _, _ in fields]
     out_rows = [header]
     lengths = [len(x) for x in header]
+    # (key, formatter, converter) for each column, resolved once per table
+    columns = [(key, fmt.format, conv) for key, _, fmt, conv, _ in fields]
     for instance in rows:
         row = []
         out_rows.append(row)
-        for key, name, fmt, conv, _ in fields:
-            conv = conv or (lambda x: x)
-            val = instance.get(key, None)
+        for idx, (key, fmt, conv) in enumerate(columns):
+            val = instance.get(key)
             if val is None:
                 s = "-"
             else:
-                val = conv(val)
-                s = fmt.format(val)
+                s = fmt(conv(val) if conv else val)
             if replace_spaces:
                 s = s.replace(' ', '_')
-            idx = len(row)
-            lengths[idx] = max(len(s), lengths[idx])
+            if len(s) > lengths[idx]:
+                lengths[idx] = len(s)
             row.append(s)
     
     if auto_width:
@@ -1319,7 +1556,8 @@ def get_ssh_key(argstr):
         a good search term if you don't know how to do this.
       """, add_separator=False))
 
-    if not ssh_key.lower().startswith('ssh'):
+    # Only the 3-char prefix is case-folded.
+    if ssh_key[:3].lower() != 'ssh':
       raise ValueError(deindent("""
         Are you sure that's an SSH public key?
 
@@ -1396,7 +1634,7 @@ def cancel__copy(args: argparse.Namespace):
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 @parser.command(
@@ -1439,7 +1677,7 @@ def cancel__sync(args: argparse.Namespace):
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 def default_start_date():
     return datetime.now(timezone.utc).strftime("%Y-%m-%d")
@@ -1668,7 +1906,7 @@ def copy(args: argparse.Namespace):
                     print(rj["msg"])
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 '''
@@ -1722,7 +1960,7 @@ def vm__copy(args: argparse.Namespace):
                 print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 '''
 
 @parser.command(
@@ -1843,7 +2081,7 @@ def cloud__copy(args: argparse.Namespace):
         print("When the operation is finished you should see 'Cloud Copy Operation Finished' in the instance status bar.")  
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 @parser.command(
@@ -1910,7 +2148,7 @@ def take__snapshot(args: argparse.Namespace):
             print(data.get("msg", "Unknown error with snapshot request"))
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 def validate_frequency_values(day_of_the_week, hour_of_the_day, frequency):
 
@@ -1936,15 +2174,18 @@ def validate_frequency_values(day_of_the_week, hour_of_the_day, frequency):
             raise_frequency_error()
 
 
-def add_scheduled_job(args, req_json, cli_command, api_endpoint, request_method, instance_id, contract_end_date):
+def add_scheduled_job(args, req_json, cli_command, api_endpoint, request_method, instance_id, contract_end_date=None):
     start_timestamp, end_timestamp = convert_dates_to_timestamps(args)
-    if args.end_date is None:
-        end_timestamp=contract_end_date
-        args.end_date = convert_timestamp_to_date(contract_end_date)
+    use_contract_end = args.end_date is None and contract_end_date is not None
+    if use_contract_end:
+        end_timestamp = contract_end_date
 
     if start_timestamp >= end_timestamp:
         raise ValueError("--start_date must be less than --end_date.")
 
+    # args is left untouched; the contract end date is only formatted for display once the range is valid
+    end_date = convert_timestamp_to_date(contract_end_date) if use_contract_end else args.end_date
+
     day, hour, frequency = args.day, args.hour, args.schedule
 
     schedule_job_url = apiurl(args, f"/commands/schedule_job/")
@@ -1961,7 +2202,7 @@ def add_scheduled_job(args, req_json, cli_command, api_endpoint, request_method,
                 "instance_id": instance_id
             }
                 # Send a POST request
-    response = requests.post(schedule_job_url, headers=headers, json=request_body)
+    response = http_post(args, schedule_job_url, headers=headers, json=request_body)
 
     if args.explain:
         print("request json: ")
@@ -1969,15 +2210,15 @@ def add_scheduled_job(args, req_json, cli_command, api_endpoint, request_method,
 
         # Handle the response based on the status code
     if response.status_code == 200:
-        print(f"add_scheduled_job insert: success - Scheduling {frequency} job to {cli_command} from {args.start_date} UTC to {args.end_date} UTC")
+        print(f"add_scheduled_job insert: success - Scheduling {frequency} job to {cli_command} from {args.start_date} UTC to {end_date} UTC")
     elif response.status_code == 401:
         print(f"add_scheduled_job insert: failed status_code: {response.status_code}. It could be because you aren't using a valid api_key.")
     elif response.status_code == 422:
         user_input = input("Existing scheduled job found. Do you want to update it (y|n)? ")
         if user_input.strip().lower() == "y":
-            scheduled_job_id = response.json()["scheduled_job_id"]
+            scheduled_job_id = response_json(response)["scheduled_job_id"]
             schedule_job_url = apiurl(args, f"/commands/schedule_job/{scheduled_job_id}/")
-            response = update_scheduled_job(cli_command, schedule_job_url, frequency, args.start_date, args.end_date, request_body)
+            response = update_scheduled_job(cli_command, schedule_job_url, frequency, args.start_date, end_date, request_body)
         else:
             print("Job update aborted by the user.")
     else:
@@ -1985,7 +2226,7 @@ def add_scheduled_job(args, req_json, cli_command, api_endpoint, request_method,
         print(f"add_scheduled_job insert: failed error: {response.status_code}. Response body: {response.text}")        
 
 def update_scheduled_job(cli_command, schedule_job_url, frequency, start_date, end_date, request_body):
-    response = requests.put(schedule_job_url, headers=headers, json=request_body)
+    response = get_session().put(schedule_job_url, headers=headers, json=request_body, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
 
         # Raise an exception for HTTP errors
     response.raise_for_status()
@@ -2070,7 +2311,7 @@ def create__env_var(args):
     r = http_post(args, url, headers=headers, json=data)
     r.raise_for_status()
 
-    result = r.json()
+    result = response_json(r)
     if result.get("success"):
         print(result.get("msg", "Environment variable created successfully."))
     else:
@@ -2132,6 +2373,11 @@ def generate_ssh_key(auto_yes=False):
     """
     
     print("No SSH key provided. Generating a new SSH key pair and adding public key to account...")
+
+    # Check if ssh-keygen is available before touching any existing keys
+    if shutil.which('ssh-keygen') is None:
+        print("Error: ssh-keygen not found. Please install OpenSSH client tools.", file=sys.stderr)
+        sys.exit(1)
     
     # Define paths
     ssh_dir = Path.home() / '.ssh'
@@ -2146,7 +2392,9 @@ def generate_ssh_key(auto_yes=False):
         sys.exit(1)
     
     # Check if any part of the key pair already exists and backup if needed
-    if private_key_path.exists() or public_key_path.exists():
+    private_exists = private_key_path.exists()
+    public_exists = public_key_path.exists()
+    if private_exists or public_exists:
         print(f"An SSH key pair 'id_ed25519' already exists in {ssh_dir}")
         if auto_yes:
             print("Auto-answering yes to backup existing key pair.")
@@ -2164,12 +2412,12 @@ def generate_ssh_key(auto_yes=False):
         
         try:
             # Backup existing private key if it exists
-            if private_key_path.exists():
+            if private_exists:
                 private_key_path.rename(backup_private_path)
                 print(f"Backed up existing private key to: {backup_private_path}")
             
             # Backup existing public key if it exists
-            if public_key_path.exists():
+            if public_exists:
                 public_key_path.rename(backup_public_path)
                 print(f"Backed up existing public key to: {backup_public_path}")
                 
@@ -2179,13 +2427,6 @@ def generate_ssh_key(auto_yes=False):
         
         print("Generating new SSH key pair and adding public key to account...")
     
-    # Check if ssh-keygen is available
-    try:
-        subprocess.run(['ssh-keygen', '--help'], capture_output=True, check=False)
-    except FileNotFoundError:
-        print("Error: ssh-keygen not found. Please install OpenSSH client tools.", file=sys.stderr)
-        sys.exit(1)
-    
     # Generate the SSH key pair
     try:
         cmd = [
@@ -2221,10 +2462,7 @@ def generate_ssh_key(auto_yes=False):
     
     # Read and return the public key content
     try:
-        with open(public_key_path, 'r') as f:
-            public_key_content = f.read().strip()
-        
-        return public_key_content
+        return public_key_path.read_text().strip()
         
     except IOError as e:
         print(f"Error reading generated public key: {e}", file=sys.stderr)
@@ -2311,7 +2549,7 @@ def create__endpoint(args):
     if (args.explain):
         print("request json: ")
         print(json_blob)
-    r = requests.post(url, headers=headers,json=json_blob)
+    r = http_post(args, url, headers=headers, json=json_blob)
     r.raise_for_status()
     if 'application/json' in r.headers.get('Content-Type', ''):
         try:
@@ -2324,6 +2562,14 @@ def create__endpoint(args):
         print("The response is not JSON. Content-Type:", r.headers.get('Content-Type'))
         print(r.text)
 
+def resolve_onstart_cmd(args):
+    """Sets args.onstart_cmd from the --onstart file if given, falling back to --entrypoint."""
+    if args.onstart:
+        with open(args.onstart, "r") as reader:
+            args.onstart_cmd = reader.read()
+    if args.onstart_cmd is None:
+        args.onstart_cmd = args.entrypoint
+
 def get_runtype(args):
     runtype = 'ssh'
     if args.args:
@@ -2383,12 +2629,8 @@ def validate_portal_config(json_blob):
     else:
         json_blob['env']['PORTAL_CONFIG'] = "|".join(filtered_config)
 
-@parser.command(
-    argument("id", help="id of instance type to launch (returned from search offers)", type=int),
-    argument("--template_hash", help="Create instance from template info", type=str),
-    argument("--user", help="User to use with docker create. This breaks some images, so only use this if you are certain you need it.", type=str),
-    argument("--disk", help="size of local disk partition in GB", type=float, default=10),
-    argument("--image", help="docker container image to launch", type=str),
+# Container/launch options shared by create instance and launch instance
+instance_config_arguments = (
     argument("--login", help="docker login arguments for private repo authentication, surround with '' ", type=str),
     argument("--label", help="label to set on the instance", type=str),
     argument("--onstart", help="filename to use as onstart script", type=str),
@@ -2404,9 +2646,18 @@ def validate_portal_config(json_blob):
     argument("--extra", help=argparse.SUPPRESS),
     argument("--env",   help="env variables and port mapping options, surround with '' ", type=str),
     argument("--args",  nargs=argparse.REMAINDER, help="list of arguments passed to container ENTRYPOINT. Onstart is recommended for this purpose. (must be last argument)"),
-    #argument("--create-from", help="Existing instance id to use as basis for new instance. Instance configuration should usually be identical, as only the difference from the base image is copied.", type=str),
     argument("--force", help="Skip sanity checks when creating from an existing instance", action="store_true"),
     argument("--cancel-unavail", help="Return error if scheduling fails (rather than creating a stopped instance)", action="store_true"),
+)
+
+@parser.command(
+    argument("id", help="id of instance type to launch (returned from search offers)", type=int),
+    argument("--template_hash", help="Create instance from template info", type=str),
+    argument("--user", help="User to use with docker create. This breaks some images, so only use this if you are certain you need it.", type=str),
+    argument("--disk", help="size of local disk partition in GB", type=float, default=10),
+    argument("--image", help="docker container image to launch", type=str),
+    *instance_config_arguments,
+    #argument("--create-from", help="Existing instance id to use as basis for new instance. Instance configuration should usually be identical, as only the difference from the base image is copied.", type=str),
     argument("--bid_price", help="(OPTIONAL) create an INTERRUPTIBLE instance with per machine bid price in $/hour", type=float),
     argument("--create-volume", metavar="VOLUME_ASK_ID", help="Create a new local volume using an ID returned from the \"search volumes\" command and link it to the new instance", type=int),
     argument("--link-volume", metavar="EXISTING_VOLUME_ID", help="ID of an existing rented volume to link to the instance during creation. (returned from \"show volumes\" cmd)", type=int),
@@ -2454,11 +2705,7 @@ def create__instance(args: argparse.Namespace):
     :param argparse.Namespace args: Namespace with many fields relevant to the endpoint.
     """
 
-    if args.onstart:
-        with open(args.onstart, "r") as reader:
-            args.onstart_cmd = reader.read()
-    if args.onstart_cmd is None:
-        args.onstart_cmd = args.entrypoint
+    resolve_onstart_cmd(args)
 
     runtype = None
     json_blob ={
@@ -2501,11 +2748,7 @@ def create__instance(args: argparse.Namespace):
     #print(f"put asks/{args.id}/  runtype:{runtype}")
     url = apiurl(args, "/asks/{id}/".format(id=args.id))
 
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     if args.raw:
         return r
     else:
@@ -2732,11 +2975,7 @@ def create__volume(args: argparse.Namespace):
 
     url = apiurl(args, "/volumes/")
 
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     if args.raw:
         return r
     else:
@@ -2766,11 +3005,7 @@ def create__network_volume(args: argparse.Namespace):
 
     url = apiurl(args, "/network_volumes/")
 
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     if args.raw:
         return r
     else:
@@ -2931,7 +3166,7 @@ def delete__env_var(args):
     r = http_del(args, url, headers=headers, json=data)
     r.raise_for_status()
 
-    result = r.json()
+    result = response_json(r)
     if result.get("success"):
         print(result.get("msg", "Environment variable deleted successfully."))
     else:
@@ -3026,21 +3261,21 @@ def delete__volume(args: argparse.Namespace):
         print("Deleted. {}".format(r.json()))
 
 
-def destroy_instance(id,args):
-    url = apiurl(args, "/instances/{id}/".format(id=id))
+def destroy_instance(instance_id, args):
+    url = apiurl(args, f"/instances/{instance_id}/")
     r = http_del(args, url, headers=headers,json={})
     r.raise_for_status()
     if args.raw:
         return r
     elif (r.status_code == 200):
-        rj = r.json();
+        rj = response_json(r);
         if (rj["success"]):
-            print("destroying instance {id}.".format(**(locals())));
+            print(f"destroying instance {instance_id}.");
         else:
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 @parser.command(
@@ -3067,8 +3302,27 @@ def destroy__instance(args):
 def destroy__instances(args):
     """
     """
-    for id in args.ids:
-        destroy_instance(id, args)
+    failed = {}  # instance id -> error
+
+    def destroy(instance_id):
+        # One failed delete is reported and doesn't stop the rest of the list
+        try:
+            return destroy_instance(instance_id, args)
+        except requests.exceptions.RequestException as e:
+            # str(e) can include the request url, and with it the api_key query arg
+            error = f"failed with error {e.response.status_code}" if e.response is not None else type(e).__name__
+            print(f"failed to destroy instance {instance_id}: {error}", file=sys.stderr)
+            failed[instance_id] = error
+
+    # The API has no batch delete, so the per-instance DELETEs run concurrently over the pooled session
+    with ThreadPoolExecutor(max_workers=min(16, len(args.ids))) as executor:
+        results = list(executor.map(destroy, args.ids))
+
+    if args.raw:
+        # Failed deletes are listed too, in the API's own success/msg shape, so scripts can see them
+        return [{"id": instance_id, "success": False, "msg": failed[instance_id]} if instance_id in failed
+                else response_json(r) for instance_id, r in zip(args.ids, results)]
+    return 1 if failed else None
 
 @parser.command(
     usage="vastai destroy team",
@@ -3127,11 +3381,7 @@ def execute(args):
     """
     url = apiurl(args, "/instances/command/{id}/".format(id=args.id))
     json_blob={"command": args.COMMAND} 
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob )
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     if (args.schedule):
         validate_frequency_values(args.day, args.hour, args.schedule)
@@ -3144,19 +3394,15 @@ def execute(args):
     if (r.status_code == 200):
         rj = r.json()
         if (rj["success"]):
-            for i in range(0,30):
-                time.sleep(0.3)
-                url = rj["result_url"]
-                r = requests.get(url)
-                if (r.status_code == 200):
-                    filtered_text = r.text.replace(rj["writeable_path"], '');
-                    print(filtered_text)
-                    break
+            r = poll_result_url(rj["result_url"])
+            if r is not None:
+                filtered_text = r.text.replace(rj["writeable_path"], '');
+                print(filtered_text)
         else:
             print(rj);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 
@@ -3331,15 +3577,11 @@ def label__instance(args):
     """
     url       = apiurl(args, "/instances/{id}/".format(id=args.id))
     json_blob = { "label": args.label }
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     rj = r.json();
     if rj["success"]:
-        print("label for {args.id} set to {args.label}.".format(**(locals())));
+        print(f"label for {args.id} set to {args.label}.");
     else:
         print(rj["msg"]);
 
@@ -3350,15 +3592,34 @@ def fetch_url_content(url):
     return response.text
 
 
-def _get_gpu_names() -> List[str]:
+def poll_result_url(url, deadline=10.0, delay=0.05, max_delay=1.0):
+    """Polls a result_url until it returns 200 or deadline seconds pass.
+
+    Results are often ready within a fraction of a second, so polling starts
+    fast and backs off exponentially. Returns the response, or None on timeout.
+    """
+    t0 = time.monotonic()
+    while True:
+        time.sleep(delay)
+        r = get_session().get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+        if r.status_code == 200:
+            return r
+        if time.monotonic() - t0 >= deadline:
+            return None
+        delay = min(delay * 1.8, max_delay)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_gpu_names() -> Tuple[str, ...]:
     """Returns a set of GPU names available on Vast.ai, with results cached for 24 hours."""
     
     def is_cache_valid() -> bool:
         """Checks if the cache file exists and is less than 24 hours old."""
-        if not os.path.exists(CACHE_FILE):
+        try:
+            mtime = os.stat(CACHE_FILE).st_mtime
+        except FileNotFoundError:
             return False
-        cache_age = datetime.now() - datetime.fromtimestamp(os.path.getmtime(CACHE_FILE))
-        return cache_age < CACHE_DURATION
+        return time.time() - mtime < CACHE_DURATION.total_seconds()
     
     if is_cache_valid():
         with open(CACHE_FILE, "r") as file:
@@ -3366,18 +3627,41 @@ def _get_gpu_names() -> List[str]:
     else:
         endpoint = "/api/v0/gpu_names/unique/"
         url = f"{server_url_default}{endpoint}"
-        r = requests.get(url, headers={})
+        r = get_session().get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
         r.raise_for_status()  # Will raise an exception for HTTP errors
-        gpu_names = r.json()
-        with open(CACHE_FILE, "w") as file:
-            json.dump(gpu_names, file)
+        gpu_names = response_json(r)
+        # Write to a temp file and rename it into place, so a concurrent vastai never reads a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(CACHE_FILE), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(gpu_names, file)
+            os.replace(tmp_path, CACHE_FILE)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
-    formatted_gpu_names = [
+    # A tuple, so the memoized result can't be modified by callers
+    formatted_gpu_names = tuple(
         name.replace(" ", "_").replace("-", "_") for name in gpu_names['gpu_names']
-    ]
+    )
     return formatted_gpu_names
 
 
+class LazyChoices(object):
+    """argparse choices whose values are only loaded when a command actually checks or lists them."""
+    def __init__(self, load):
+        self.load = load
+
+    def __contains__(self, item):
+        return item in self.load()
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+
 REGIONS = {
 "North_America": "[AG, BS, BB, BZ, CA, CR, CU, DM, DO, SV, GD, GT, HT, HN, JM, MX, NI, PA, KN, LC, VC, TT, US]",
 "South_America": "[AR, BO, BR, CL, CO, EC, FK, GF, GY, PY, PE, SR, UY, VE]",
@@ -3387,46 +3671,25 @@ REGIONS = {
 "Africa": "[DZ, AO, BJ, BW, BF, BI, CV, CM, CF, TD, KM, CG, CD, CI, DJ, EG, GQ, ER, SZ, ET, GA, GM, GH, GN, GW, KE, LS, LR, LY, MG, MW, ML, MR, MU, MA, MZ, NA, NE, NG, RW, ST, SN, SC, SL, SO, ZA, SS, SD, TZ, TG, TN, UG, ZM, ZW]"
 }
 
+_REGION_LIST_RE = re.compile(r"\[\s*[^,\s]{2}\s*(?:,\s*[^,\s]{2}\s*)*\]")
+
 def _is_valid_region(region):
     """region is valid if it is a key in REGIONS or a string list of country codes."""
-    if region in REGIONS:
-        return True
-    if region.startswith("[") and region.endswith("]"):
-        country_codes = region[1:-1].split(',')
-        return all(len(code.strip()) == 2 for code in country_codes)
-    return False
+    return region in REGIONS or _REGION_LIST_RE.fullmatch(region) is not None
 
 def _parse_region(region):
     """Returns a string in a list format of two-char country codes."""
-    if region in REGIONS:
-        return REGIONS[region]
-    return region
+    return REGIONS.get(region, region)
 
 @parser.command(
-    argument("-g", "--gpu-name", type=str, required=True, choices=_get_gpu_names(), help="Name of the GPU model, replace spaces with underscores"),
+    argument("-g", "--gpu-name", type=str, required=True, choices=LazyChoices(_get_gpu_names), metavar="GPU_NAME", help="Name of the GPU model, replace spaces with underscores. One of: %(choices)s"),
     argument("-n", "--num-gpus", type=str, required=True, choices=["1", "2", "4", "8", "12", "14"], help="Number of GPUs required"),
     argument("-r", "--region", type=str, help="Geographical location of the instance"),
     argument("-i", "--image", required=True, help="Name of the image to use for instance"),
     argument("-d", "--disk", type=float, default=16.0, help="Disk space required in GB"),
     argument("--limit", default=3, type=int, help=""),
     argument("-o", "--order", type=str, help="Comma-separated list of fields to sort on. postfix field with - to sort desc. ex: -o 'num_gpus,total_flops-'.  default='score-'", default='score-'),
-    argument("--login", help="docker login arguments for private repo authentication, surround with '' ", type=str),
-    argument("--label", help="label to set on the instance", type=str),
-    argument("--onstart", help="filename to use as onstart script", type=str),
-    argument("--onstart-cmd", help="contents of onstart script as single argument", type=str),
-    argument("--entrypoint", help="override entrypoint for args launch instance", type=str),
-    argument("--ssh",     help="Launch as an ssh instance type", action="store_true"),
-    argument("--jupyter", help="Launch as a jupyter instance instead of an ssh instance", action="store_true"),
-    argument("--direct",  help="Use (faster) direct connections for jupyter & ssh", action="store_true"),
-    argument("--jupyter-dir", help="For runtype 'jupyter', directory in instance to use to launch jupyter. Defaults to image's working directory", type=str),
-    argument("--jupyter-lab", help="For runtype 'jupyter', Launch instance with jupyter lab", action="store_true"),
-    argument("--lang-utf8", help="Workaround for images with locale problems: install and generate locales before instance launch, and set locale to C.UTF-8", action="store_true"),
-    argument("--python-utf8", help="Workaround for images with locale problems: set python's locale to C.UTF-8", action="store_true"),
-    argument("--extra", help=argparse.SUPPRESS),
-    argument("--env",   help="env variables and port mapping options, surround with '' ", type=str),
-    argument("--args",  nargs=argparse.REMAINDER, help="list of arguments passed to container ENTRYPOINT. Onstart is recommended for this purpose. (must be last argument)"),
-    argument("--force", help="Skip sanity checks when creating from an existing instance", action="store_true"),
-    argument("--cancel-unavail", help="Return error if scheduling fails (rather than creating a stopped instance)", action="store_true"),
+    *instance_config_arguments,
     argument("--template_hash",   help="template hash which contains all relevant information about an instance. This can be used as a replacement for other parameters describing the instance configuration", type=str),
     usage="vastai launch instance [--help] [--api-key API_KEY] <gpu_name> <num_gpus> <image> [geolocation] [disk_space]",
     help="Launch the top instance from the search offers based on the given parameters",
@@ -3466,52 +3729,31 @@ def launch__instance(args):
 
     :param argparse.Namespace args: Namespace with many fields relevant to the endpoint.
     """
-    args_query = f"num_gpus={args.num_gpus} gpu_name={args.gpu_name}"
+    query_parts = [f"num_gpus={args.num_gpus}", f"gpu_name={args.gpu_name}"]
 
     if args.region:
         if not _is_valid_region(args.region):
             print("Invalid region or country codes provided.")
             return
         region_query = _parse_region(args.region)
-        args_query += f" geolocation in {region_query}"
+        query_parts.append(f"geolocation in {region_query}")
 
     if args.disk:
-        args_query += f" disk_space>={args.disk}"
+        query_parts.append(f"disk_space>={args.disk}")
+
+    args_query = " ".join(query_parts)
 
     base_query = {"verified": {"eq": True}, "external": {"eq": False}, "rentable": {"eq": True}, "rented": {"eq": False}}
     query = parse_query(args_query, base_query, offers_fields, offers_alias, offers_mult)
 
-    order = []
-    for name in args.order.split(","):
-        name = name.strip()
-        if not name: continue
-        direction = "asc"
-        field = name
-        if name.strip("-") != name:
-            direction = "desc"
-            field = name.strip("-")
-        if name.strip("+") != name:
-            direction = "asc"
-            field = name.strip("+")
-        #print(f"{field} {name} {direction}")
-        if field in offers_alias:
-            field = offers_alias[field];
-        order.append([field, direction])
+    order = parse_order(args.order, offers_alias)
     query["order"] = order
     query["type"] = "on-demand"
-    # For backwards compatibility, support --type=interruptible option
-    if query["type"] == 'interruptible':
-        query["type"] = 'bid'
     if (args.limit):
         query["limit"] = int(args.limit)
     query["allocated_storage"] = args.disk
 
-    if args.onstart:
-        with open(args.onstart, "r") as reader:
-            args.onstart_cmd = reader.read()
-
-    if args.onstart_cmd is None:
-        args.onstart_cmd = args.entrypoint
+    resolve_onstart_cmd(args)
 
     json_blob = {
         "client_id": "me", 
@@ -3568,6 +3810,8 @@ def launch__instance(args):
         print(f"An error occurred: {err}")
 
 
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+
 @parser.command(
     argument("INSTANCE_ID", help="id of instance", type=int),
     argument("--tail", help="Number of lines to show from the end of the logs (default '1000')", type=str),
@@ -3586,25 +3830,17 @@ def logs(args):
         json_blob.update({'tail': args.tail})
     if args.daemon_logs:
         json_blob.update({'daemon_logs': 'true'})
-    if args.explain:
-        print("request json: ")
-        print(json_blob)
-
-    r = http_put(args, url, headers=headers, json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     if r.status_code == 200:
         rj = r.json()
-        for i in range(0, 30):
-            time.sleep(0.3)
-            url = rj["result_url"]
-            print(f"waiting on logs for instance {args.INSTANCE_ID} fetching from {url}")
-            r = requests.get(url)
-            if r.status_code == 200:
-                result = r.text
-                cleaned_text = re.sub(r'\n\s*\n', '\n', result)
-                print(cleaned_text)
-                break
+        url = rj["result_url"]
+        print(f"waiting on logs for instance {args.INSTANCE_ID} fetching from {url}")
+        r = poll_result_url(url)
+        if r is not None:
+            result = r.text
+            cleaned_text = _BLANK_LINES_RE.sub('\n', result)
+            print(cleaned_text)
         else:
             print(rj["msg"])
     else:
@@ -3626,17 +3862,13 @@ def prepay__instance(args):
     """
     url       = apiurl(args, "/instances/prepay/{id}/".format(id=args.id))
     json_blob = { "amount": args.amount }
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     rj = r.json();
     if rj["success"]:
         timescale = round( rj["timescale"], 3)
         discount_rate = 100.0*round( rj["discount_rate"], 3)
-        print("prepaid for {timescale} months of instance {args.id} applying ${args.amount} credits for a discount of {discount_rate}%".format(**(locals())));
+        print(f"prepaid for {timescale} months of instance {args.id} applying ${args.amount} credits for a discount of {discount_rate}%");
     else:
         print(rj["msg"]);
 
@@ -3677,12 +3909,12 @@ def reboot__instance(args):
     if (r.status_code == 200):
         rj = r.json();
         if (rj["success"]):
-            print("Rebooting instance {args.id}.".format(**(locals())));
+            print(f"Rebooting instance {args.id}.");
         else:
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 @parser.command(
@@ -3705,12 +3937,12 @@ def recycle__instance(args):
     if (r.status_code == 200):
         rj = r.json()
         if (rj["success"]):
-            print("Recycling instance {args.id}.".format(**(locals())));
+            print(f"Recycling instance {args.id}.");
         else:
             print(rj["msg"]);
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 @parser.command(
     argument("id", help="id of user to remove", type=int),
@@ -3751,7 +3983,7 @@ def reports(args):
         print("request json: ")
         print(json_blob)
     
-    r = requests.get(url, headers=headers, json=json_blob)
+    r = http_get(args, url, headers=headers, json=json_blob)
     r.raise_for_status()
 
     if (r.status_code == 200):
@@ -3769,41 +4001,48 @@ def reset__api_key(args):
     #url = apiurl(args, "/users/current/reset-apikey/", {"owner": "me"})
     url = apiurl(args, "/commands/reset_apikey/" )
     json_blob = {"client_id": "me",}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     print("api-key reset ".format(r.json()))
 
 
 def exec_with_threads(f, args, nt=16, max_retries=5):
-    def worker(sub_args):
-        for arg in sub_args:
-            retries = 0
-            while retries <= max_retries:
-                try:
-                    result = None
-                    if isinstance(arg,tuple):
-                        result = f(*arg)
-                    else:
-                        result = f(arg)
-                    if result:  # Assuming a truthy return value means success
-                        break
-                except Exception as e:
-                    print(str(e))
-                    pass
-                retries += 1
-                stime = 0.25 * 1.3 ** retries
-                print(f"retrying in {stime}s")
-                time.sleep(stime)  # Exponential backoff
+    def worker(arg):
+        retries = 0
+        while retries <= max_retries:
+            error = None
+            try:
+                result = None
+                if isinstance(arg,tuple):
+                    result = f(*arg)
+                else:
+                    result = f(arg)
+                if result:  # Assuming a truthy return value means success
+                    break
+            except Exception as e:
+                error = e
+            retries += 1
+            if retries > max_retries:
+                if error:
+                    logging.error(f"{arg}: {error}")
+                break  # out of retries, don't sleep before giving up
+            stime = 0.25 * 1.3 ** retries
+            # Each retry is logged as a single record
+            logging.warning(f"{arg}: {error or 'failed'}, retrying in {stime:.2f}s")
+            time.sleep(stime)  # Exponential backoff
+
+    if not args:
+        return
 
-    # Split args into nt sublists
-    args_per_thread = math.ceil(len(args) / nt)
-    sublists = [args[i:i + args_per_thread] for i in range(0, len(args), args_per_thread)]
+    # A single arg (e.g. one batch of ids) gains nothing from a thread pool
+    if len(args) == 1:
+        worker(args[0])
+        return
 
+    # Each arg is its own task, so a backoff sleep only holds up the arg being retried;
+    # the other threads keep draining the executor's queue in the meantime.
+    # Workers share the pooled session from get_session(), so concurrent calls reuse its connections
     with ThreadPoolExecutor(max_workers=nt) as executor:
-        executor.map(worker, sublists)
+        executor.map(worker, args)
 
 
 def split_into_sublists(lst, k):
@@ -3823,31 +4062,27 @@ def split_list(lst, k):
     return [lst[i:i + k] for i in range(0, len(lst), k)]
 
 
-def start_instance(id,args):
+def start_instance(instance_id, args):
 
     json_blob ={"state": "running"}
-    if isinstance(id,list):
+    if isinstance(instance_id, list):
         url = apiurl(args, "/instances/")
-        json_blob["ids"] = id
+        json_blob["ids"] = instance_id
     else:
-        url = apiurl(args, "/instances/{id}/".format(id=id))
+        url = apiurl(args, f"/instances/{instance_id}/")
 
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     if (r.status_code == 200):
-        rj = r.json()
+        rj = response_json(r)
         if (rj["success"]):
-            print("starting instance {id}.".format(**(locals())))
+            print(f"starting instance {instance_id}.")
         else:
             print(rj["msg"])
         return True
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()))
+        print(f"failed with error {r.status_code}")
     return False
 
 @parser.command(
@@ -3890,31 +4125,27 @@ def start__instances(args):
 
 
 
-def stop_instance(id,args):
+def stop_instance(instance_id, args):
 
     json_blob ={"state": "stopped"}
-    if isinstance(id,list):
+    if isinstance(instance_id, list):
         url = apiurl(args, "/instances/")
-        json_blob["ids"] = id
+        json_blob["ids"] = instance_id
     else:
-        url = apiurl(args, "/instances/{id}/".format(id=id))
+        url = apiurl(args, f"/instances/{instance_id}/")
 
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     if (r.status_code == 200):
-        rj = r.json()
+        rj = response_json(r)
         if (rj["success"]):
-            print("stopping instance {id}.".format(**(locals())))
+            print(f"stopping instance {instance_id}.")
         else:
             print(rj["msg"])
         return True
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()))
+        print(f"failed with error {r.status_code}")
     return False
 
 
@@ -4046,7 +4277,7 @@ def search__benchmarks(args):
         return 1  
     #url = apiurl(args, "/benchmarks", {"select_cols" : ['id','last_update','machine_id','score'], "select_filters" : query})
     url = apiurl(args, "/benchmarks", {"select_cols" : ['*'], "select_filters" : query})
-    r = requests.get(url, headers=headers)
+    r = http_get(args, url, headers=headers)
     r.raise_for_status()
     rows = r.json()
     if True: # args.raw:
@@ -4152,7 +4383,7 @@ def search__invoices(args):
         print("Error: ", e)
         return 1  
     url = apiurl(args, "/invoices", {"select_cols" : ['*'], "select_filters" : query})
-    r = requests.get(url, headers=headers)
+    r = http_get(args, url, headers=headers)
     r.raise_for_status()
     rows = r.json()
     if True: # args.raw:
@@ -4285,22 +4516,7 @@ def search__offers(args):
         if args.query is not None:
             query = parse_query(args.query, query, offers_fields, offers_alias, offers_mult)
 
-        order = []
-        for name in args.order.split(","):
-            name = name.strip()
-            if not name: continue
-            direction = "asc"
-            field = name
-            if name.strip("-") != name:
-                direction = "desc"
-                field = name.strip("-")
-            if name.strip("+") != name:
-                direction = "asc"
-                field = name.strip("+")
-            #print(f"{field} {name} {direction}")
-            if field in offers_alias:
-                field = offers_alias[field];
-            order.append([field, direction])
+        order = parse_order(args.order, offers_alias)
 
         query["order"] = order
         query["type"] = args.type
@@ -4472,7 +4688,7 @@ def search__templates(args):
             display_table(rows, displayable_fields)
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()))
+        print(f"failed with error {r.status_code}")
 
 @parser.command(
     argument("-n", "--no-default", action="store_true", help="Disable default query"),
@@ -4540,21 +4756,7 @@ def search__volumes(args: argparse.Namespace):
         if args.query is not None:
             query = parse_query(args.query, query, vol_offers_fields, {}, offers_mult)
 
-        order = []
-        for name in args.order.split(","):
-            name = name.strip()
-            if not name: continue
-            direction = "asc"
-            field = name
-            if name.strip("-") != name:
-                direction = "desc"
-                field = name.strip("-")
-            if name.strip("+") != name:
-                direction = "asc"
-                field = name.strip("+")
-            if field in offers_alias:
-                field = offers_alias[field];
-            order.append([field, direction])
+        order = parse_order(args.order, offers_alias)
 
         query["order"] = order
         if (args.limit):
@@ -4637,21 +4839,7 @@ def search__network_volumes(args: argparse.Namespace):
         if args.query is not None:
             query = parse_query(args.query, query, vol_offers_fields, {}, offers_mult)
 
-        order = []
-        for name in args.order.split(","):
-            name = name.strip()
-            if not name: continue
-            direction = "asc"
-            field = name
-            if name.strip("-") != name:
-                direction = "desc"
-                field = name.strip("-")
-            if name.strip("+") != name:
-                direction = "asc"
-                field = name.strip("+")
-            if field in offers_alias:
-                field = offers_alias[field];
-            order.append([field, direction])
+        order = parse_order(args.order, offers_alias)
 
         query["order"] = order
         if (args.limit):
@@ -4694,6 +4882,7 @@ def set__api_key(args):
     """
     with open(APIKEY_FILE, "w") as writer:
         writer.write(args.new_api_key)
+    read_api_key.cache_clear()
     print("Your api key has been saved in {}".format(APIKEY_FILE))
     
     APIKEY_FILE_HOME = os.path.expanduser("~/.vast_api_key") # Legacy
@@ -4737,7 +4926,7 @@ def set__user(args):
     with open(args.file, 'r') as file:
         params = json.load(file)
     url = apiurl(args, "/users/")
-    r = requests.put(url, headers=headers, json=params)
+    r = http_put(args, url, headers=headers, json=params)
     r.raise_for_status()
     print(f"{r.json()}")
 
@@ -5042,7 +5231,7 @@ def show__deposit(args):
     req_url = apiurl(args, "/instances/balance/{id}/".format(id=args.id) , {"owner": "me"} )
     r = http_get(args, req_url)
     r.raise_for_status()
-    print(json.dumps(r.json(), indent=1, sort_keys=True))
+    print(json.dumps(response_json(r), indent=1, sort_keys=True))
 
 
 @parser.command(
@@ -5061,63 +5250,43 @@ def show__earnings(args):
     :rtype:
     """
 
-    Minutes = 60.0
-    Hours	= 60.0*Minutes
-    Days	= 24.0*Hours
-    Years	= 365.0*Days
-    cday    = time.time() / Days
+    cday = time.time() / SECONDS_PER_DAY
     sday = cday - 1.0
     eday = cday - 1.0
 
-    try:
-        import dateutil
-        from dateutil import parser
-
-    except ImportError:
-        print("""\nWARNING: Missing dateutil, can't parse time format""")
-
     if args.end_date:
         try:
-            end_date = dateutil.parser.parse(str(args.end_date))
+            end_date = parse_date(args.end_date)
             end_date_txt = end_date.isoformat()
             end_timestamp = end_date.timestamp()
-            eday = end_timestamp / Days
+            eday = end_timestamp / SECONDS_PER_DAY
         except ValueError as e:
             print(f"Warning: Invalid end date format! Ignoring end date! \n {str(e)}")
 
     if args.start_date:
         try:
-            start_date = dateutil.parser.parse(str(args.start_date))
+            start_date = parse_date(args.start_date)
             start_date_txt = start_date.isoformat()
             start_timestamp = start_date.timestamp()
-            sday = start_timestamp / Days
+            sday = start_timestamp / SECONDS_PER_DAY
         except ValueError as e:
             print(f"Warning: Invalid start date format! Ignoring start date! \n {str(e)}")
 
     req_url = apiurl(args, "/users/me/machine-earnings", {"owner": "me", "sday": sday, "eday": eday, "machid" :args.machine_id});
     r = http_get(args, req_url)
     r.raise_for_status()
-    rows = r.json()
+    rows = response_json(r)
 
     if args.raw:
         return rows
     print(json.dumps(rows, indent=1, sort_keys=True))
 
 
-def sum(X, k):
-    y = 0
-    for x in X:
-        a = float(x.get(k,0))
-        y += a
-    return y
+def _sum_field(X, k):
+    return math.fsum(float(x.get(k, 0)) for x in X)
 
-def select(X,k):
-    Y = set()
-    for x in X:
-        v = x.get(k,None)
-        if v is not None:
-            Y.add(v)
-    return Y
+def _distinct_field(X, k):
+    return {v for v in (x.get(k) for x in X) if v is not None}
 
 @parser.command(
     argument("-s", "--show-values", action="store_true", help="Show the values of environment variables"),
@@ -5130,12 +5299,12 @@ def show__env_vars(args):
     r = http_get(args, url, headers=headers)
     r.raise_for_status()
 
-    env_vars = r.json().get("secrets", {})
+    env_vars = response_json(r).get("secrets", {})
 
     if args.raw:
         if not args.show_values:
             # Replace values with placeholder in raw output
-            masked_env_vars = {k: "*****" for k, v in env_vars.items()}
+            masked_env_vars = dict.fromkeys(env_vars, "*****")
             # indent was 2
             return masked_env_vars
         else:
@@ -5144,13 +5313,13 @@ def show__env_vars(args):
         if not env_vars:
             print("No environment variables found.")
         else:
+            # Collect the listing and print it in one write
+            lines = []
             for key, value in env_vars.items():
-                print(f"Name: {key}")
-                if args.show_values:
-                    print(f"Value: {value}")
-                else:
-                    print("Value: *****")
-                print("---")
+                lines.append(f"Name: {key}")
+                lines.append(f"Value: {value if args.show_values else '*****'}")
+                lines.append("---")
+            print("\n".join(lines))
 
     if not args.show_values:
         print("\nNote: Values are hidden. Use --show-values or -s option to display them.")
@@ -5179,7 +5348,8 @@ def show__invoices(args):
 
     r = http_get(args, req_url)
     r.raise_for_status()
-    rows = r.json()["invoices"]
+    body = r.json()
+    rows = body["invoices"]
     # print("Timestamp for first row: ", rows[0]["timestamp"])
     invoice_filter_data = filter_invoice_items(args, rows)
     rows = invoice_filter_data["rows"]
@@ -5189,7 +5359,7 @@ def show__invoices(args):
 
     if (args.instance_label):
         #print(rows)
-        contract_ids = select(rows, 'instance_id')
+        contract_ids = _distinct_field(rows, 'instance_id')
         #print(contract_ids)
 
         url = apiurl(args, f"/contracts/fetch/")
@@ -5208,17 +5378,12 @@ def show__invoices(args):
         filtered_rows = result.json()["contracts"]
         #print(rows)
 
-        contract_ids = select(filtered_rows, 'id')
+        contract_ids = frozenset(_distinct_field(filtered_rows, 'id'))
         #print(contract_ids)
 
-        rows2 = []
-        for row in rows:
-            id = row.get("instance_id", None)
-            if id in contract_ids:
-                rows2.append(row)
-        rows = rows2
+        rows = [row for row in rows if row.get("instance_id") in contract_ids]
 
-    current_charges = r.json()["current"]
+    current_charges = body["current"]
     if args.quiet:
         for row in rows:
             id = row.get("id", None)
@@ -5231,20 +5396,31 @@ def show__invoices(args):
     else:
         print(filter_header)
         display_table(rows, invoice_fields)
-        print(f"Total: ${sum(rows, 'amount')}")
+        print(f"Total: ${_sum_field(rows, 'amount')}")
         print("Current: ", current_charges)
 
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
 # Helper to convert date string or int to timestamp
+@functools.lru_cache(maxsize=256, typed=True)
 def to_timestamp_(val):
     if isinstance(val, int):
         return val
     if isinstance(val, str):
         if val.isdigit():
             return int(val)
+        # YYYY-MM-DD (UTC midnight) by hand; date() still rejects out-of-range values
+        if len(val) == 10 and val[4] == '-' and val[7] == '-' and (val[:4] + val[5:7] + val[8:]).isdigit():
+            return (date(int(val[:4]), int(val[5:7]), int(val[8:])).toordinal() - _EPOCH_ORDINAL) * 86400
         return int(datetime.strptime(val + "+0000", '%Y-%m-%d%z').timestamp())
     raise ValueError("Invalid date format")
 
 charge_types = ['instance','volume','serverless', 'i', 'v', 's']
+charge_type_names = {
+    'i': 'instance', 'instance': 'instance',
+    'v': 'volume', 'volume': 'volume',
+    's': 'serverless', 'serverless': 'serverless',
+}
 invoice_types = {
     "transfers": "transfer",
     "stripe": "stripe_payments",
@@ -5255,12 +5431,24 @@ invoice_types = {
     "payout_paypal": "paypal_manual",
     "payout_wise": "wise_manual"
 }
+invoice_type_keys = tuple(invoice_types)
+
+class MapChoicesAction(argparse.Action):
+    """Stores mapping[value] for each (already choice-validated) value instead of the value itself."""
+    def __init__(self, *args, mapping, **kwargs):
+        self.mapping = mapping
+        super().__init__(*args, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, [self.mapping[v] for v in values])
+
+invoice_type_help = f'Filter which types of invoices to show: {{{", ".join(invoice_type_keys)}}}'
 
 @parser.command(
     argument('-i', '--invoices', mutex_group='grp', action='store_true', required=True, help='Show invoices instead of charges'),
-    argument('-it', '--invoice-type', choices=invoice_types.keys(), nargs='+', metavar='type', help=f'Filter which types of invoices to show: {{{", ".join(invoice_types.keys())}}}'),
+    argument('-it', '--invoice-type', choices=invoice_type_keys, nargs='+', metavar='type', action=MapChoicesAction, mapping=invoice_types, help=invoice_type_help),
     argument('-c', '--charges', mutex_group='grp', action='store_true', required=True, help='Show charges instead of invoices'),
-    argument('-ct', '--charge-type', choices=charge_types, nargs='+', metavar='type', help='Filter which types of charges to show: {i|instance, v|volume, s|serverless}'),
+    argument('-ct', '--charge-type', choices=charge_types, nargs='+', metavar='type', action=MapChoicesAction, mapping=charge_type_names, help='Filter which types of charges to show: {i|instance, v|volume, s|serverless}'),
     argument('-s', '--start-date', help='Start date (YYYY-MM-DD or timestamp)'),
     argument('-e', '--end-date', help='End date (YYYY-MM-DD or timestamp)'),
     argument('-l', '--limit', type=int, default=20, help='Number of results per page (default: 20, max: 100)'),
@@ -5268,6 +5456,7 @@ invoice_types = {
     argument('-f', '--format', choices=['table', 'tree'], default='table', help='Output format for charges (default: table)'),
     argument('-v', '--verbose', action='store_true', help='Include full Instance Charge details and Invoice Metadata (tree view only)'),
     argument('--latest-first', action='store_true', help='Sort by latest first'),
+    argument('--all-pages', action='store_true', help='Fetch all remaining pages without prompting'),
     usage="vastai show invoices-v1 [OPTIONS]",
     help="Get billing (invoices/charges) history reports with advanced filtering and pagination",
     epilog=deindent("""
@@ -5291,6 +5480,9 @@ invoice_types = {
 
             # Show the last 10 instance (only) charges over a 7 day period ending in 2025-12-25, sorted by latest charges first
             vastai show invoices-v1 --charges -ct instance --end-date 2025-12-25 -l 10 --latest-first
+
+            # Show all invoices for November 2025 without being prompted for each page
+            vastai show invoices-v1 -i -s 2025-11-01 -e 2025-11-30 --all-pages
     """)
 )
 def show__invoices_v1(args):
@@ -5302,23 +5494,23 @@ def show__invoices_v1(args):
         output_lines.append("NOTE: To view results in color and table/tree format please install the 'rich' python module with 'pip install rich'\n")
         has_rich = False
 
-    # Handle default start and end date values
-    if not args.start_date and not args.end_date:
-        args.end_date = int(time.time())  # Set end date to current time if both are missing
-    if not args.start_date:
-        args.start_date = args.end_date - 7 * 24*60*60  # Default to 7 days before given end date
-    elif not args.end_date:
-        args.end_date = args.start_date + 7 * 24*60*60  # Default to 7 days after given start date
-    
     try:
         # Parse dates - handle both YYYY-MM-DD format and timestamps
-        start_timestamp = to_timestamp_(args.start_date)
-        end_timestamp = to_timestamp_(args.end_date)
+        start_timestamp = to_timestamp_(args.start_date) if args.start_date else None
+        end_timestamp = to_timestamp_(args.end_date) if args.end_date else None
     except Exception as e:
         print(f"Error parsing dates: {e}")
         print("Use format YYYY-MM-DD or UNIX timestamp")
         return
 
+    # Handle default start and end date values
+    if start_timestamp is None and end_timestamp is None:
+        end_timestamp = int(time.time())  # Set end date to current time if both are missing
+    if start_timestamp is None:
+        start_timestamp = end_timestamp - SECONDS_PER_WEEK  # Default to 7 days before given end date
+    elif end_timestamp is None:
+        end_timestamp = start_timestamp + SECONDS_PER_WEEK  # Default to 7 days after given start date
+
     if has_rich and not args.no_color:
         print("(use --no-color to disable colored output)\n")
     
@@ -5336,71 +5528,91 @@ def show__invoices_v1(args):
     }
     if args.charges:
         params['format'] = args.format
-        for ct in args.charge_type or []:
-            filters = params['select_filters'].setdefault('type', {}).setdefault('in', [])
-            if   ct in {'i','instance'}:   filters.append('instance')
-            elif ct in {'v','volume'}:     filters.append('volume')
-            elif ct in {'s','serverless'}: filters.append('serverless')
+        if args.charge_type:
+            params['select_filters']['type'] = {'in': args.charge_type}
     
-    if args.invoices:
-        for it in args.invoice_type or []:
-            filters = params['select_filters'].setdefault('service', {}).setdefault('in', [])
-            filters.append(invoice_types[it])
+    if args.invoices and args.invoice_type:
+        params['select_filters']['service'] = {'in': args.invoice_type}
     
     if args.next_token:
         params['after_token'] = args.next_token
 
     endpoint = '/api/v0/charges/' if args.charges else '/api/v1/invoices/'
     url = apiurl(args, endpoint, query_args=params)
+    next_page_url = None  # url without after_token; only the token changes between pages
+
+    def next_url(token):
+        nonlocal next_page_url
+        if next_page_url is None:
+            next_page_url = apiurl(args, endpoint, query_args={k: v for k, v in params.items() if k != 'after_token'})
+        return f"{next_page_url}&after_token={_query_value(token)}"
 
-    found_results, found_count = [], 0
-    looping = True
-    while looping:
-        response = http_get(args, url)
-        response.raise_for_status()
-        response = response.json()
-
-        found_results += response.get('results', [])
-        found_count += response.get('count', 0)
-        total = response.get('total', 0)
-        next_token = response.get('next_token')
+    # With --all-pages the next page is fetched in the background while the current one is rendered
+    prefetcher = ThreadPoolExecutor(max_workers=1) if args.all_pages else None
+    if args.all_pages:
+        args.full = True  # output is not interactive, so never hand it to the pager
+
+    found_results, formatted_results, found_count = [], [], 0
+    try:
+        next_response = None
+        looping = True
+        while looping:
+            response = next_response.result() if next_response else http_get(args, url)
+            response.raise_for_status()
+            response = response_json(response)
+
+            page_results = response.get('results', [])
+            found_results += page_results
+            found_count += response.get('count', 0)
+            total = response.get('total', 0)
+            next_token = response.get('next_token')
+            next_response = prefetcher.submit(http_get, args, next_url(next_token)) if prefetcher and next_token else None
         
-        if args.raw or has_rich is False:
-            output_lines.append("Raw response:\n" + json.dumps(response, indent=2))
-            if next_token:
-                print(f"Next page token: {next_token}\n")
-        elif not found_results:
-            output_lines.append("No results found")
-        else:  # Display results
-            formatted_results = format_invoices_charges_results(args, deepcopy(found_results))
-            if args.invoices:
-                rich_obj = create_rich_table_for_invoices(formatted_results)
-            elif args.format == 'tree':
-                rich_obj = create_charges_tree(formatted_results)
-            else:
-                rich_obj = create_rich_table_for_charges(args, formatted_results)
+            if args.raw or has_rich is False:
+                output_lines.append("Raw response:\n" + json.dumps(response, indent=2))
+                if next_token:
+                    print(f"Next page token: {next_token}\n")
+            elif not found_results:
+                output_lines.append("No results found")
+            else:  # Display results
+                # Each page is formatted (in place) once as it arrives; earlier pages are already formatted
+                page_formatted = format_invoices_charges_results(args, page_results)
+                formatted_results += page_formatted
+                # --all-pages prints each page as it arrives, so only that page's rows are rendered
+                shown = page_formatted if args.all_pages else formatted_results
+                if args.invoices:
+                    rich_obj = create_rich_table_for_invoices(shown)
+                elif args.format == 'tree':
+                    rich_obj = create_charges_tree(shown)
+                else:
+                    rich_obj = create_rich_table_for_charges(args, shown)
 
-            output_lines.append(rich_object_to_string(rich_obj, no_color=args.no_color))
-            output_lines.append(f"Showing {found_count} of {total} results")
-            if next_token:
-                output_lines.append(f"Next page token: {next_token}\n")
+                output_lines.append(rich_object_to_string(rich_obj, no_color=args.no_color))
+                output_lines.append(f"Showing {found_count} of {total} results")
+                if next_token:
+                    output_lines.append(f"Next page token: {next_token}\n")
         
-        paging = print_or_page(args, '\n'.join(output_lines))
+            paging = print_or_page(args, '\n'.join(output_lines))
 
-        if next_token and not paging:
-            if has_rich:
-                ans = Confirm.ask("Fetch next page?", show_default=False, default=False)
-            else:
-                ans = input("Fetch next page? (y/N): ").strip().lower() == 'y'
-            if ans:
-                params['after_token'] = next_token
-                url = apiurl(args, endpoint, query_args=params)
+            if next_response:
                 output_lines.clear()
-                args.full = True
+            elif next_token and not paging:
+                if has_rich:
+                    ans = Confirm.ask("Fetch next page?", show_default=False, default=False)
+                else:
+                    ans = input("Fetch next page? (y/N): ").strip().lower() == 'y'
+                if ans:
+                    url = next_url(next_token)
+                    output_lines.clear()
+                    args.full = True
+                else:
+                    looping = False
             else:
                 looping = False
-        else:
-            looping = False
+    finally:
+        # On an error or Ctrl-C, drop any queued page fetch instead of waiting on it
+        if prefetcher:
+            prefetcher.shutdown(wait=False, cancel_futures=True)
 
 def format_invoices_charges_results(args, results):
     indices_to_remove = []
@@ -5566,9 +5778,9 @@ def show__instance(args):
     #r = http_get(req_url)
     r = http_get(args, req_url)
     r.raise_for_status()
-    row = r.json()["instances"]
+    row = response_json(r)["instances"]
     row['duration'] = time.time() - row['start_date']
-    row['extra_env'] = {env_var[0]: env_var[1] for env_var in row['extra_env']}
+    row['extra_env'] = env_pairs_to_dict(row.get('extra_env'))
     if args.raw:
         return row
     else:
@@ -5591,11 +5803,14 @@ def show__instances(args = {}, extra = {}):
     #r = http_get(req_url)
     r = http_get(args, req_url)
     r.raise_for_status()
-    rows = r.json()["instances"]
+    rows = response_json(r)["instances"]
+    now = time.time()
     for row in rows:
-        row = {k: strip_strings(v) for k, v in row.items()} 
-        row['duration'] = time.time() - row['start_date']
-        row['extra_env'] = {env_var[0]: env_var[1] for env_var in row['extra_env']}
+        # Strip in place so the dicts in rows keep the fields set below
+        for k, v in row.items():
+            row[k] = v.strip() if isinstance(v, str) else strip_strings(v)
+        row['duration'] = now - row['start_date']
+        row['extra_env'] = env_pairs_to_dict(row.get('extra_env'))
     if 'internal' in extra:
         return [str(row[extra['field']]) for row in rows]
     elif args.quiet:
@@ -5651,17 +5866,23 @@ def show__clusters(args: argparse.Namespace):
 
     rows = []
     for cluster_id, cluster_data in response_data['clusters'].items():
-        machine_ids = [ node["machine_id"] for node in cluster_data["nodes"]]
+        machine_ids = []
+        manager_node = None
+        for node in cluster_data["nodes"]:
+            machine_ids.append(node["machine_id"])
+            if manager_node is None and node['is_cluster_manager']:
+                manager_node = node
 
-        manager_node = next(node for node in cluster_data['nodes'] if node['is_cluster_manager'])
+        if manager_node is None:
+            logging.warning(f"cluster {cluster_id} has no manager node")
 
         row_data = {
             'id': cluster_id,
             'subnet': cluster_data['subnet'],
-            'node_count': len(cluster_data['nodes']),
-            'machine_ids': str(machine_ids),
-            'manager_id': str(manager_node['machine_id']),
-            'manager_ip': manager_node['local_ip'],
+            'node_count': len(machine_ids),
+            'machine_ids': ','.join(map(str, machine_ids)),
+            'manager_id': str(manager_node['machine_id']) if manager_node else None,
+            'manager_ip': manager_node['local_ip'] if manager_node else None,
         }
 
         rows.append(row_data)
@@ -5691,7 +5912,7 @@ def show__overlays(args: argparse.Namespace):
             'subnet': overlay['internal_subnet'] if overlay['internal_subnet'] else 'N/A',
             'cluster_id': overlay['cluster_id'],
             'instance_count': len(overlay['instances']),
-            'instances': str(overlay['instances']),
+            'instances': ','.join(map(str, overlay['instances'])),
         }
         rows.append(row_data)
     display_table(rows, overlay_fields, replace_spaces=False)
@@ -5805,9 +6026,10 @@ def show__volumes(args: argparse.Namespace):
     r.raise_for_status()
     rows = r.json()["volumes"]
     processed = []
+    now = time.time()
     for row in rows:
         row = {k: strip_strings(v) for k, v in row.items()} 
-        row['duration'] = time.time() - row['start_date']
+        row['duration'] = now - row['start_date']
         processed.append(row)
     if args.raw:
         return processed
@@ -6178,6 +6400,7 @@ def tfa__login(args):
                 # Write the session key to the TFA key file
                 with open(TFAKEY_FILE, "w") as f:
                     f.write(session_key)
+                read_api_key.cache_clear()
                 print(f"{SUCCESS} 2FA login successful! Session key saved to {TFAKEY_FILE}")
             else:
                 print(f"{SUCCESS} 2FA login successful! Your session key has been refreshed.")
@@ -6564,11 +6787,7 @@ def transfer__credit(args: argparse.Namespace):
         "recipient": args.recipient,
         "amount":    args.amount,
     }
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
 
     if (r.status_code == 200):
         rj = r.json();
@@ -6578,7 +6797,7 @@ def transfer__credit(args: argparse.Namespace):
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 @parser.command(
     argument("id", help="id of autoscale group to update", type=int),
@@ -6611,11 +6830,7 @@ def update__workergroup(args):
     if args.search_params is not None:
         query = args.search_params + query
     json_blob = {"client_id": "me", "autojob_id": args.id, "min_load": args.min_load, "target_util": args.target_util, "cold_mult": args.cold_mult, "cold_workers": args.cold_workers, "test_workers" : args.test_workers, "template_hash": args.template_hash, "template_id": args.template_id, "search_params": query, "launch_args": args.launch_args, "gpu_ram": args.gpu_ram, "endpoint_name": args.endpoint_name, "endpoint_id": args.endpoint_id}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     if 'application/json' in r.headers.get('Content-Type', ''):
         try:
             print("workergroup update {}".format(r.json()))
@@ -6648,11 +6863,7 @@ def update__endpoint(args):
     id  = args.id
     url = apiurl(args, f"/endptjobs/{id}/" )
     json_blob = {"client_id": "me", "endptjob_id": args.id, "min_load": args.min_load, "min_cold_load":args.min_cold_load,"target_util": args.target_util, "cold_mult": args.cold_mult, "cold_workers": args.cold_workers, "max_workers" : args.max_workers, "endpoint_name": args.endpoint_name, "endpoint_state": args.endpoint_state, "autoscaler_instance":args.auto_instance}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     if 'application/json' in r.headers.get('Content-Type', ''):
         try:
             print("update endpoint {}".format(r.json()))
@@ -6677,7 +6888,7 @@ def update__env_var(args):
     r = http_put(args, url, headers=headers, json=data)
     r.raise_for_status()
 
-    result = r.json()
+    result = response_json(r)
     if result.get("success"):
         print(result.get("msg", "Environment variable updated successfully."))
     else:
@@ -6689,7 +6900,7 @@ def update__env_var(args):
     argument("--template_hash_id", help="new template hash ID to associate with the instance", type=str),
     argument("--image", help="new image UUID for the instance", type=str),
     argument("--args", help="new arguments for the instance", type=str),
-    argument("--env", help="new environment variables for the instance", type=json.loads),
+    argument("--env", help="new environment variables for the instance", type=json_arg),
     argument("--onstart", help="new onstart script for the instance", type=str),
     usage="vastai update instance ID [OPTIONS]",
     help="Update recreate an instance from a new/updated template",
@@ -6718,6 +6929,10 @@ def update__instance(args):
     if args.onstart:
         json_blob["onstart"] = args.onstart
 
+    if len(json_blob) == 1:
+        print("Error: nothing to update. Pass at least one of --template_id, --template_hash_id, --image, --args, --env or --onstart.", file=sys.stderr)
+        return 1
+
     if args.explain:
         print("request json: ")
         print(json_blob)
@@ -6725,7 +6940,7 @@ def update__instance(args):
     r = http_put(args, url, headers=headers, json=json_blob)
 
     if r.status_code == 200:
-        response_data = r.json()
+        response_data = response_json(r)
         if response_data.get("success"):
             print(f"Instance {args.id} updated successfully.")
             print("Updated instance details:")
@@ -6812,12 +7027,7 @@ def update__template(args):
     }
 
     json_blob = template
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-
-    r = http_put(args, url, headers=headers, json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     try:
         rj = r.json()
         if rj["success"]:
@@ -6850,27 +7060,19 @@ def update__ssh_key(args):
     print(r.json())
 
 def convert_dates_to_timestamps(args):
-    selector_flag = ""
     end_timestamp = time.time()
-    start_timestamp = time.time() - (24*60*60)
-    start_date_txt = ""
-    end_date_txt = ""
-
-    import dateutil
-    from dateutil import parser
+    start_timestamp = end_timestamp - SECONDS_PER_DAY
 
     if args.end_date:
         try:
-            end_date = dateutil.parser.parse(str(args.end_date))
-            end_date_txt = end_date.isoformat()
+            end_date = parse_date(args.end_date)
             end_timestamp = time.mktime(end_date.timetuple())
         except ValueError as e:
             print(f"Warning: Invalid end date format! Ignoring end date! \n {str(e)}")
     
     if args.start_date:
         try:
-            start_date = dateutil.parser.parse(str(args.start_date))
-            start_date_txt = start_date.isoformat()
+            start_date = parse_date(args.start_date)
             start_timestamp = time.mktime(start_date.timetuple())
         except ValueError as e:
             print(f"Warning: Invalid start date format! Ignoring end date! \n {str(e)}")
@@ -6889,17 +7091,6 @@ def filter_invoice_items(args: argparse.Namespace, rows: List) -> Dict:
 
     """
 
-    try:
-        #import vast_pdf
-        import dateutil
-        from dateutil import parser
-    except ImportError:
-        print("""\nWARNING: The 'vast_pdf' library is not present. This library is used to print invoices in PDF format. If
-        you do not need this feature you can ignore this message. To get the library you should download the vast-python
-        github repository. Just do 'git@github.com:vast-ai/vast-python.git' and then 'cd vast-python'. Once in that
-        directory you can run 'vast.py' and it will have access to 'vast_pdf.py'. The library depends on a Python
-        package called Borb to make the PDF files. To install this package do 'pip3 install borb'.\n""")
-
     """
     try:
         vast_pdf
@@ -6916,14 +7107,14 @@ def filter_invoice_items(args: argparse.Namespace, rows: List) -> Dict:
 
     if args.end_date:
         try:
-            end_date = dateutil.parser.parse(str(args.end_date))
+            end_date = parse_date(args.end_date)
             end_date_txt = end_date.isoformat()
             end_timestamp = time.mktime(end_date.timetuple())
         except ValueError:
             print("Warning: Invalid end date format! Ignoring end date!")
     if args.start_date:
         try:
-            start_date = dateutil.parser.parse(str(args.start_date))
+            start_date = parse_date(args.start_date)
             start_date_txt = start_date.isoformat()
             start_timestamp = time.mktime(start_date.timetuple())
         except ValueError:
@@ -7092,11 +7283,7 @@ def cancel__maint(args):
         return
 
     json_blob = {"client_id": "me", "machine_id": args.id}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     print(r.text)
     print(f"Cancel maintenance window(s) scheduled for machine {args.id} success".format(r.json()))
 
@@ -7119,7 +7306,7 @@ def cleanup_machine(args, machine_id):
                 print(rj["msg"])
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()))
+        print(f"failed with error {r.status_code}")
 
 @parser.command(
     argument("id", help="id of machine to cleanup", type=int),
@@ -7151,11 +7338,7 @@ def cleanup__machine(args):
 def defrag__machines(args):
     url = apiurl(args, "/machines/defrag_offers/" )
     json_blob = {"machine_ids": args.IDs}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = requests.put(url, headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     if 'application/json' in r.headers.get('Content-Type', ''):
         try:
             print(f"defragment result: {r.json()}")
@@ -7186,7 +7369,7 @@ def delete__machine(args):
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 def list_machine(args, id):
@@ -7224,7 +7407,7 @@ def list_machine(args, id):
             if args.raw:
                 return r
             else:
-                print("offers created/updated for machine {id},  @ ${price_gpu_}/gpu/hr, ${price_inetu_}/GB up, ${price_inetd_}/GB down, {min_chunk_}/min gpus, max discount_rate {discount_rate_}, till {end_date_}, duration {duration_}".format(**locals()))
+                print(f"offers created/updated for machine {id},  @ ${price_gpu_}/gpu/hr, ${price_inetu_}/GB up, ${price_inetd_}/GB down, {min_chunk_}/min gpus, max discount_rate {discount_rate_}, till {end_date_}, duration {duration_}")
                 num_extended = rj.get("extended", 0)
 
                 if num_extended > 0:
@@ -7237,7 +7420,7 @@ def list_machine(args, id):
                 print(rj["msg"])
     else:
         print(r.text)
-        print("failed with error {r.status_code}".format(**locals()))
+        print(f"failed with error {r.status_code}")
 
 
 @parser.command(
@@ -7434,7 +7617,7 @@ def remove__defjob(args):
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 
@@ -7741,12 +7924,12 @@ def set__defjob(args):
         rj = r.json();
         if (rj["success"]):
             print(
-                "bids created for machine {args.id},  @ ${args.price_gpu}/gpu/day, ${args.price_inetu}/GB up, ${args.price_inetd}/GB down".format(**locals()));
+                f"bids created for machine {args.id},  @ ${args.price_gpu}/gpu/day, ${args.price_inetu}/GB up, ${args.price_inetd}/GB down");
         else:
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 
 def smart_split(s, char):
@@ -7842,11 +8025,7 @@ def set__min_bid(args):
     """
     url = apiurl(args, "/machines/{id}/minbid/".format(id=args.id))
     json_blob = {"client_id": "me", "price": args.price,}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     print("Per gpu min bid price changed".format(r.json()))
 
 
@@ -7880,11 +8059,7 @@ def schedule__maint(args):
         return
 
     json_blob = {"client_id": "me", "sdate": string_to_unix_epoch(args.sdate), "duration": args.duration, "maintenance_category": args.maintenance_category}
-    if (args.explain):
-        print("request json: ")
-        print(json_blob)
-    r = http_put(args, url,  headers=headers,json=json_blob)
-    r.raise_for_status()
+    r = put_json(args, url, json_blob)
     print(f"Maintenance window scheduled for {dt} success".format(r.json()))
 
 @parser.command(
@@ -8026,7 +8201,7 @@ def unlist__machine(args):
             print(rj["msg"]);
     else:
         print(r.text);
-        print("failed with error {r.status_code}".format(**locals()));
+        print(f"failed with error {r.status_code}");
 
 @parser.command(
     argument("id", help="id of network volume offer to unlist", type=int),
@@ -8662,7 +8837,8 @@ except:
 def main():
     global ARGS
     parser.add_argument("--url", help="Server REST API URL", default=server_url_default)
-    parser.add_argument("--retry", help="Retry limit", default=3)
+    parser.add_argument("--retry", help="Retry limit", type=int, default=3)
+    parser.add_argument("--timeout", help=f"Read timeout in seconds for each API request (default {READ_TIMEOUT:g})", type=float, default=READ_TIMEOUT)
     parser.add_argument("--explain", action="store_true", help="Output verbose explanation of mapping of CLI calls to HTTPS API endpoints")
     parser.add_argument("--raw", action="store_true", help="Output machine-readable json")
     parser.add_argument("--full", action="store_true", help="Print full results instead of paging with `less` for commands that support it")
@@ -8674,16 +8850,16 @@ def main():
     ARGS = args = parser.parse_args()
     #print(args.api_key)
     if args.api_key is api_key_guard:
-        key_file = TFAKEY_FILE if os.path.exists(TFAKEY_FILE) else APIKEY_FILE
-        if args.explain:
-            print(f'checking {key_file}')
-        if os.path.exists(key_file):
+        # a 2FA session key takes precedence over the normal API key
+        args.api_key = None
+        for key_file in (TFAKEY_FILE, APIKEY_FILE):
             if args.explain:
-                print(f'reading key from {key_file}')
-            with open(key_file, "r") as reader:
-                args.api_key = reader.read().strip()
-        else:
-            args.api_key = None
+                print(f'checking {key_file}')
+            args.api_key = read_api_key(key_file)
+            if args.api_key is not None:
+                if args.explain:
+                    print(f'reading key from {key_file}')
+                break
     if args.api_key:
         headers["Authorization"] = "Bearer " + args.api_key
 
@@ -8706,7 +8882,7 @@ def main():
                 try:
                     print(json.dumps(res, indent=1, sort_keys=True))
                 except:
-                    print(json.dumps(res.json(), indent=1, sort_keys=True))
+                    print(json.dumps(response_json(res), indent=1, sort_keys=True))
                 sys.exit(0)
             sys.exit(res)
         
@@ -8724,18 +8900,23 @@ def main():
                 if os.path.exists(TFAKEY_FILE):
                     print(f"Failed with error {e.response.status_code}: Your 2FA session has expired.")
                     os.remove(TFAKEY_FILE)
-                    if os.path.exists(APIKEY_FILE):
-                        with open(APIKEY_FILE, "r") as reader:
-                            args.api_key = reader.read().strip()
-                            headers["Authorization"] = "Bearer " + args.api_key
-                            print(f"Trying again with your normal API Key from {APIKEY_FILE}...")
-                            continue
+                    read_api_key.cache_clear()
+                    api_key = read_api_key(APIKEY_FILE)
+                    if api_key is not None:
+                        args.api_key = api_key
+                        headers["Authorization"] = "Bearer " + args.api_key
+                        print(f"Trying again with your normal API Key from {APIKEY_FILE}...")
+                        continue
                     else:
                         print("Please log in using the `tfa login` command and try again.")
                         break
 
             print(f"Failed with error {e.response.status_code}: {errmsg}")
             break
+
+        except requests.exceptions.Timeout:
+            print("Request timed out; try a larger --timeout.")
+            break
         
         except ValueError as e:
             print(e)